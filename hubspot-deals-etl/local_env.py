@@ -0,0 +1,14 @@
+"""Environment helpers for the local test scripts"""
+
+import os
+import functools
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+@functools.cache
+def get_access_token() -> Optional[str]:
+    """Load .env once per process and return HUBSPOT_ACCESS_TOKEN"""
+    load_dotenv()
+    return os.getenv("HUBSPOT_ACCESS_TOKEN")
@@ -7,6 +7,7 @@ and load them into PostgreSQL.
 
 import os
 import dlt
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from dotenv import load_dotenv
 from services.data_source import hubspot_deals_source
 import logging
@@ -21,11 +22,40 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# libpq TCP keepalive settings, so the connection DLT holds open across
+# the COPY and merge steps is not dropped by idle network middleboxes
+POSTGRES_KEEPALIVE_PARAMS = {
+    "keepalives": "1",
+    "keepalives_idle": "30",
+    "keepalives_interval": "10",
+    "keepalives_count": "5",
+}
+
+
+def with_keepalive_params(database_url: str) -> str:
+    """
+    Add TCP keepalive parameters to a PostgreSQL connection URL
+    
+    Parameters already present in the URL are left untouched.
+    
+    Args:
+        database_url: PostgreSQL connection URL
+        
+    Returns:
+        Connection URL including keepalive query parameters
+    """
+    parts = urlsplit(database_url)
+    query = dict(parse_qsl(parts.query))
+    for key, value in POSTGRES_KEEPALIVE_PARAMS.items():
+        query.setdefault(key, value)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
 
 def run_pipeline(
     tenant_id: str = "test_account",
     scan_type: str = "full",
-    batch_size: int = 100
+    batch_size: int = 100,
+    loader_file_format: str = "csv"
 ):
     """
     Run the HubSpot Deals ETL pipeline
@@ -34,6 +64,8 @@ def run_pipeline(
         tenant_id: Tenant/organization identifier
         scan_type: Type of scan (full or incremental)
         batch_size: Number of deals per API request
+        loader_file_format: DLT load file format ("csv" loads via COPY,
+            "insert_values" via multi-row INSERT statements)
     """
     
     logger.info("=" * 70)
@@ -52,28 +84,32 @@ def run_pipeline(
         logger.error("❌ DATABASE_URL not found in .env")
         return False
     
-    logger.info(f"\n📋 Configuration:")
+    logger.info("\n📋 Configuration:")
     logger.info(f"  - Tenant ID: {tenant_id}")
     logger.info(f"  - Scan Type: {scan_type}")
     logger.info(f"  - Batch Size: {batch_size}")
+    logger.info(f"  - Loader File Format: {loader_file_format}")
     logger.info(f"  - Database: {database_url.split('@')[1] if '@' in database_url else 'configured'}")
     
     try:
         # Initialize DLT source
-        logger.info(f"\n🔧 Initializing DLT source...")
+        logger.info("\n🔧 Initializing DLT source...")
         source = hubspot_deals_source(
             access_token=access_token,
             tenant_id=tenant_id,
-            batch_size=batch_size
+            batch_size=batch_size,
+            scan_type=scan_type
         )
         
         logger.info(f"✅ Source initialized: {source}")
         
         # Create DLT pipeline
-        logger.info(f"\n🚀 Creating DLT pipeline...")
+        logger.info("\n🚀 Creating DLT pipeline...")
         pipeline = dlt.pipeline(
             pipeline_name="hubspot_deals",
-            destination="postgres",
+            destination=dlt.destinations.postgres(
+                credentials=with_keepalive_params(database_url)
+            ),
             dataset_name="hubspot_deals",
             progress="log"
         )
@@ -81,16 +117,18 @@ def run_pipeline(
         logger.info(f"✅ Pipeline created: {pipeline.pipeline_name}")
         
         # Run the pipeline
-        logger.info(f"\n📦 Running extraction...")
-        logger.info(f"-" * 70)
+        logger.info("\n📦 Running extraction...")
+        logger.info("-" * 70)
         
-        load_info = pipeline.run(source)
+        # "csv" makes the postgres destination bulk-load each package with
+        # COPY into the staging dataset, then merge into the final table
+        load_info = pipeline.run(source, loader_file_format=loader_file_format)
         
-        logger.info(f"-" * 70)
-        logger.info(f"\n✅ Pipeline completed successfully!")
+        logger.info("-" * 70)
+        logger.info("\n✅ Pipeline completed successfully!")
         
         # Print results
-        logger.info(f"\n📊 Results:")
+        logger.info("\n📊 Results:")
         logger.info(f"  - Pipeline: {load_info.pipeline.pipeline_name}")
         logger.info(f"  - Dataset: {load_info.pipeline.dataset_name}")
         logger.info(f"  - Loads: {len(load_info.loads_ids)}")
@@ -101,17 +139,17 @@ def run_pipeline(
             for job in load_info.load_packages[0].jobs['failed_jobs']:
                 logger.error(f"    - {job}")
         else:
-            logger.info(f"  - Status: All jobs completed successfully")
+            logger.info("  - Status: All jobs completed successfully")
         
         # Print table statistics
-        logger.info(f"\n📈 Tables loaded:")
+        logger.info("\n📈 Tables loaded:")
         for package in load_info.load_packages:
             for table_name, table_metrics in package.schema_update.items():
                 logger.info(f"  - {table_name}: {table_metrics}")
         
-        logger.info(f"\n" + "=" * 70)
-        logger.info(f"✅ ETL PIPELINE COMPLETED")
-        logger.info(f"=" * 70)
+        logger.info("\n" + "=" * 70)
+        logger.info("✅ ETL PIPELINE COMPLETED")
+        logger.info("=" * 70)
         
         return True
         
@@ -127,13 +165,16 @@ if __name__ == "__main__":
     parser.add_argument("--tenant-id", default="test_account", help="Tenant ID")
     parser.add_argument("--scan-type", default="full", choices=["full", "incremental"], help="Scan type")
     parser.add_argument("--batch-size", type=int, default=100, help="Batch size")
+    parser.add_argument("--loader-file-format", default="csv", choices=["csv", "insert_values"],
+                        help="DLT load file format (csv uses COPY)")
     
     args = parser.parse_args()
     
     success = run_pipeline(
         tenant_id=args.tenant_id,
         scan_type=args.scan_type,
-        batch_size=args.batch_size
+        batch_size=args.batch_size,
+        loader_file_format=args.loader_file_format
     )
     
     exit(0 if success else 1)
@@ -1,18 +1,43 @@
+import hashlib
+import os
+import orjson
+import random
 import requests
 import time
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Any, Union
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for the exponential backoff on 429 responses
+MAX_BACKOFF_SECONDS = 32
+
+# HubSpot Search API caps: results reachable per query and page size
+SEARCH_RESULT_LIMIT = 10000
+SEARCH_MAX_PAGE_SIZE = 200
+
+# Maximum number of ids per batch read request
+BATCH_READ_MAX_INPUTS = 100
+
+# Transient gateway/availability errors that are safe to retry
+RETRYABLE_SERVER_ERRORS = (500, 502, 503, 504)
+
 
 class HubSpotAPIError(Exception):
     """Custom exception for HubSpot API errors"""
     pass
 
 
+def _parse_json(response: requests.Response) -> Dict[str, Any]:
+    """Decode a JSON response body with orjson (much faster than stdlib json)"""
+    return orjson.loads(response.content)
+
+
 class HubSpotAPIService:
     """
     Service for interacting with HubSpot CRM API v3
@@ -20,13 +45,15 @@ class HubSpotAPIService:
     Handles:
     - Authentication
     - Rate limiting
-    - Pagination
+    - Pagination (with next-page prefetch)
     - Error handling
     - Retries
     """
     
     def __init__(self, access_token: str, api_base_url: str = "https://api.hubapi.com", 
-                 api_version: str = "v3", timeout: int = 30, max_retries: int = 3):
+                 api_version: str = "v3", timeout: int = 30, max_retries: int = 3,
+                 cache_name: Optional[str] = None,
+                 properties_cache_path: Optional[str] = None):
         """
         Initialize HubSpot API Service
         
@@ -36,6 +63,11 @@ class HubSpotAPIService:
             api_version: API version (default: v3)
             timeout: Request timeout in seconds
             max_retries: Maximum number of retries for failed requests
+            cache_name: Optional SQLite file for an on-disk cache of GET
+                responses (development only; requires requests-cache)
+            properties_cache_path: Optional JSON file holding the last deal
+                properties response and its ETag for conditional requests
+                (development only; ignored when cache_name is set)
         """
         if not access_token:
             raise ValueError("HubSpot access token is required")
@@ -45,61 +77,148 @@ class HubSpotAPIService:
         self.api_version = api_version
         self.timeout = timeout
         self.max_retries = max_retries
+        self.cache_name = cache_name
+        # requests-cache already revalidates with ETags itself; sending our
+        # own If-None-Match would leave it with 304s it never stores
+        self.properties_cache_path = (
+            os.path.expanduser(properties_cache_path)
+            if properties_cache_path and not cache_name else None
+        )
+        
+        # Endpoint URLs are fixed for the lifetime of the service
+        self._deals_url = f"{self.api_base_url}/crm/{self.api_version}/objects/deals"
+        self._deal_by_id_url = f"{self._deals_url}/{{}}"
+        self._deals_search_url = f"{self._deals_url}/search"
+        self._deals_batch_read_url = f"{self._deals_url}/batch/read"
+        self._deal_properties_url = f"{self.api_base_url}/crm/{self.api_version}/properties/deals"
         
-        # Setup session with retry strategy
+        # Request headers are constant for the lifetime of the service
+        self._headers = {
+            "Authorization": f"Bearer {self.access_token}",
+            "Content-Type": "application/json",
+            "User-Agent": "HubSpot-Deals-ETL/1.0"
+        }
+        
+        # Identifies the portal/token in on-disk caches without storing it
+        self._token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+        
+        # Setup session with retry strategy and default headers
         self.session = self._create_session()
         
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 0.1  # 100ms between requests (10 req/sec)
+        # Rate limiting: sliding one-second window of request start times
+        # (shared by the prefetch thread, so guarded by a lock)
+        self.max_requests_per_second = 10
+        self._request_times = deque(maxlen=self.max_requests_per_second)
+        # Search API has its own, stricter limit on top of the general one
+        self.max_search_requests_per_second = 5
+        self._search_request_times = deque(maxlen=self.max_search_requests_per_second)
+        self._pause_until = 0.0  # set from Retry-After on 429
+        self._rate_limit_lock = threading.Lock()
+        
+        # Deal property metadata, fetched once per service instance
+        self._deal_properties: Optional[List[Dict[str, Any]]] = None
         
-        logger.info(f"HubSpot API Service initialized - Base URL: {self.api_base_url}")
+        logger.info("HubSpot API Service initialized - Base URL: %s", self.api_base_url)
     
     def _create_session(self) -> requests.Session:
-        """Create requests session with retry strategy"""
-        session = requests.Session()
-        
-        # Retry strategy for transient errors
+        """Create requests session with retry strategy and auth headers"""
+        if self.cache_name:
+            import requests_cache
+            
+            # Cache GETs only (search/batch read POSTs always hit the API).
+            # requests-cache strips Authorization from its cache keys, so
+            # use one file per token: different portals never share responses
+            # and an invalid token can't be "verified" from another's entry
+            root, ext = os.path.splitext(self.cache_name)
+            cache_path = f"{root}-{self._token_hash[:16]}{ext}"
+            session = requests_cache.CachedSession(
+                cache_path,
+                backend="sqlite",
+                expire_after=3600,
+                allowable_methods=["GET"],
+                urls_expire_after={"*/properties/deals": 86400}
+            )
+            logger.info("HubSpot response cache enabled: %s", cache_path)
+        else:
+            session = requests.Session()
+        session.headers.update(self._headers)
+        
+        # Retry strategy for transient 5xx gateway/availability errors on
+        # GETs. Transport retries bypass the rate limiter, so 429s and all
+        # POST retries (Search and batch read) are handled in _make_request
+        # instead. Retry-After is not honoured here because urllib3 would
+        # then retry any 429 carrying it.
         retry_strategy = Retry(
             total=self.max_retries,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS"]
+            backoff_jitter=0.5,
+            status_forcelist=RETRYABLE_SERVER_ERRORS,
+            allowed_methods=frozenset(["HEAD", "GET", "OPTIONS"]),
+            respect_retry_after_header=False
         )
         
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # Keep enough pooled connections for concurrent requests so kept-alive
+        # TLS connections are reused instead of discarded when the pool is full
+        adapter = HTTPAdapter(
+            max_retries=retry_strategy,
+            pool_connections=32,
+            pool_maxsize=32,
+            pool_block=False
+        )
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         
         return session
     
-    def _get_headers(self) -> Dict[str, str]:
-        """Get request headers with authentication"""
-        return {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-            "User-Agent": "HubSpot-Deals-ETL/1.0"
-        }
-    
-    def _rate_limit(self):
-        """Apply rate limiting between requests"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
+    def _rate_limit(self, request_times: Optional[deque] = None):
+        """
+        Apply rate limiting between requests
         
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            logger.debug(f"Rate limiting: sleeping for {sleep_time:.3f}s")
-            time.sleep(sleep_time)
+        Allows bursts of up to ``max_requests_per_second`` requests and only
+        sleeps when the oldest request in the window is less than a second
+        old, so slow responses do not pay an extra fixed delay.
         
-        self.last_request_time = time.time()
+        Args:
+            request_times: Sliding window to apply (defaults to the general
+                API window; the Search API passes its own)
+        """
+        if request_times is None:
+            request_times = self._request_times
+        
+        with self._rate_limit_lock:
+            now = time.monotonic()
+            
+            # Global pause requested by a 429 Retry-After
+            if now < self._pause_until:
+                sleep_time = self._pause_until - now
+                logger.debug("Rate limiting: paused for %.3fs (Retry-After)", sleep_time)
+                time.sleep(sleep_time)
+                now = time.monotonic()
+            
+            if len(request_times) == request_times.maxlen:
+                sleep_time = 1.0 - (now - request_times[0])
+                if sleep_time > 0:
+                    logger.debug("Rate limiting: sleeping for %.3fs", sleep_time)
+                    time.sleep(sleep_time)
+                    now = time.monotonic()
+            
+            request_times.append(now)
     
-    def _make_request(self, method: str, url: str, **kwargs) -> requests.Response:
+    def _pause_requests(self, seconds: float):
+        """Pause all outgoing requests for the given number of seconds"""
+        with self._rate_limit_lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+    
+    def _make_request(self, method: str, url: str,
+                      request_times: Optional[deque] = None, **kwargs) -> requests.Response:
         """
         Make HTTP request with rate limiting and error handling
         
         Args:
             method: HTTP method (GET, POST, etc.)
             url: Request URL
+            request_times: Extra endpoint-specific rate limit window, applied
+                on every attempt on top of the general one
             **kwargs: Additional arguments for requests
             
         Returns:
@@ -108,43 +227,88 @@ class HubSpotAPIService:
         Raises:
             HubSpotAPIError: If request fails
         """
-        self._rate_limit()
+        for attempt in range(self.max_retries + 1):
+            if request_times is not None:
+                self._rate_limit(request_times)
+            self._rate_limit()
+            
+            try:
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    timeout=self.timeout,
+                    **kwargs
+                )
+                
+                # Check for HTTP errors
+                if response.status_code == 401:
+                    raise HubSpotAPIError("Authentication failed: Invalid access token")
+                elif response.status_code == 403:
+                    raise HubSpotAPIError("Forbidden: Insufficient permissions")
+                elif response.status_code == 429:
+                    # Rate limit hit
+                    if attempt >= self.max_retries:
+                        raise HubSpotAPIError(
+                            f"Rate limit exceeded after {self.max_retries} retries"
+                        )
+                    sleep_for = self._get_backoff(attempt, response.headers.get('Retry-After'))
+                    logger.warning("Rate limit hit. Retrying in %.2fs (attempt %s/%s)",
+                                   sleep_for, attempt + 1, self.max_retries)
+                    # Retry the request (waits out the pause in _rate_limit)
+                    self._pause_requests(sleep_for)
+                    continue
+                elif response.status_code in RETRYABLE_SERVER_ERRORS and attempt < self.max_retries:
+                    # Only POSTs get here; urllib3 already retried other methods.
+                    # Read-only POSTs are retried here so every attempt goes
+                    # through the rate limiter.
+                    sleep_for = self._get_backoff(attempt, response.headers.get('Retry-After'))
+                    logger.warning("Server error %s. Retrying in %.2fs (attempt %s/%s)",
+                                   response.status_code, sleep_for, attempt + 1, self.max_retries)
+                    time.sleep(sleep_for)
+                    continue
+                elif response.status_code >= 400:
+                    try:
+                        error_data = _parse_json(response) if response.content else {}
+                    except orjson.JSONDecodeError:
+                        error_data = {}
+                    # Error bodies are normally objects, but don't trust them to be
+                    if not isinstance(error_data, dict):
+                        error_data = {}
+                    error_msg = error_data.get('message', f'HTTP {response.status_code}')
+                    raise HubSpotAPIError(f"API request failed: {error_msg}")
+                
+                response.raise_for_status()
+                return response
+                
+            except requests.exceptions.Timeout:
+                raise HubSpotAPIError(f"Request timeout after {self.timeout}s")
+            except requests.exceptions.ConnectionError:
+                raise HubSpotAPIError("Connection error: Unable to reach HubSpot API")
+            except requests.exceptions.RequestException as e:
+                raise HubSpotAPIError(f"Request failed: {str(e)}")
+    
+    @staticmethod
+    def _get_backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Compute the wait before retrying a rate-limited request
         
-        try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                headers=self._get_headers(),
-                timeout=self.timeout,
-                **kwargs
-            )
+        Exponential backoff with uniform jitter, min(2^n + rand(0, 1), 32),
+        so concurrent clients do not retry in lockstep. A larger server
+        supplied Retry-After always wins.
+        
+        Args:
+            attempt: Zero-based retry attempt number
+            retry_after: Value of the Retry-After response header, if any
             
-            # Check for HTTP errors
-            if response.status_code == 401:
-                raise HubSpotAPIError("Authentication failed: Invalid access token")
-            elif response.status_code == 403:
-                raise HubSpotAPIError("Forbidden: Insufficient permissions")
-            elif response.status_code == 429:
-                # Rate limit hit
-                retry_after = response.headers.get('Retry-After', 1)
-                logger.warning(f"Rate limit hit. Retry after {retry_after}s")
-                time.sleep(int(retry_after))
-                # Retry the request
-                return self._make_request(method, url, **kwargs)
-            elif response.status_code >= 400:
-                error_data = response.json() if response.content else {}
-                error_msg = error_data.get('message', f'HTTP {response.status_code}')
-                raise HubSpotAPIError(f"API request failed: {error_msg}")
-            
-            response.raise_for_status()
-            return response
-            
-        except requests.exceptions.Timeout:
-            raise HubSpotAPIError(f"Request timeout after {self.timeout}s")
-        except requests.exceptions.ConnectionError:
-            raise HubSpotAPIError("Connection error: Unable to reach HubSpot API")
-        except requests.exceptions.RequestException as e:
-            raise HubSpotAPIError(f"Request failed: {str(e)}")
+        Returns:
+            Seconds to wait
+        """
+        backoff = min((2 ** attempt) + random.random(), MAX_BACKOFF_SECONDS)
+        try:
+            return max(backoff, float(retry_after or 0))
+        except ValueError:
+            # Retry-After given as an HTTP date; fall back to our own backoff
+            return backoff
     
     def verify_credentials(self) -> bool:
         """
@@ -154,21 +318,20 @@ class HubSpotAPIService:
             True if credentials are valid, False otherwise
         """
         try:
-            url = f"{self.api_base_url}/crm/{self.api_version}/objects/deals"
             params = {"limit": 1}
             
-            response = self._make_request("GET", url, params=params)
+            response = self._make_request("GET", self._deals_url, params=params)
             logger.info("✅ HubSpot credentials verified successfully")
             return True
             
         except HubSpotAPIError as e:
-            logger.error(f"❌ Credential verification failed: {e}")
+            logger.error("❌ Credential verification failed: %s", e)
             return False
     
     def get_deals(self, 
                   limit: int = 100,
                   after: Optional[str] = None,
-                  properties: Optional[List[str]] = None,
+                  properties: Optional[Union[List[str], str]] = None,
                   archived: bool = False) -> Dict[str, Any]:
         """
         Get deals from HubSpot with pagination
@@ -176,7 +339,8 @@ class HubSpotAPIService:
         Args:
             limit: Number of deals per request (max 100)
             after: Pagination cursor from previous response
-            properties: List of deal properties to retrieve
+            properties: List of deal properties to retrieve, or an already
+                comma-joined string (avoids re-joining on every page)
             archived: Whether to include archived deals
             
         Returns:
@@ -189,12 +353,9 @@ class HubSpotAPIService:
         """
         # Validate limit
         if limit > 100:
-            logger.warning(f"Limit {limit} exceeds max 100, setting to 100")
+            logger.warning("Limit %s exceeds max 100, setting to 100", limit)
             limit = 100
         
-        # Build URL
-        url = f"{self.api_base_url}/crm/{self.api_version}/objects/deals"
-        
         # Build query parameters
         params = {
             "limit": limit,
@@ -205,23 +366,23 @@ class HubSpotAPIService:
             params["after"] = after
         
         if properties:
-            params["properties"] = ",".join(properties)
+            params["properties"] = properties if isinstance(properties, str) else ",".join(properties)
         
-        logger.info(f"Fetching deals - Limit: {limit}, After: {after}, Archived: {archived}")
+        logger.info("Fetching deals - Limit: %s, After: %s, Archived: %s", limit, after, archived)
         
         try:
-            response = self._make_request("GET", url, params=params)
-            data = response.json()
+            response = self._make_request("GET", self._deals_url, params=params)
+            data = _parse_json(response)
             
             results_count = len(data.get("results", []))
             has_more = "paging" in data and "next" in data["paging"]
             
-            logger.info(f"Retrieved {results_count} deals. Has more: {has_more}")
+            logger.info("Retrieved %s deals. Has more: %s", results_count, has_more)
             
             return data
             
         except HubSpotAPIError as e:
-            logger.error(f"Failed to fetch deals: {e}")
+            logger.error("Failed to fetch deals: %s", e)
             raise
     
     def get_deal_by_id(self, deal_id: str, properties: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -238,129 +399,497 @@ class HubSpotAPIService:
         Raises:
             HubSpotAPIError: If deal not found or request fails
         """
-        url = f"{self.api_base_url}/crm/{self.api_version}/objects/deals/{deal_id}"
+        url = self._deal_by_id_url.format(deal_id)
         
         params = {}
         if properties:
             params["properties"] = ",".join(properties)
         
-        logger.info(f"Fetching deal ID: {deal_id}")
+        logger.info("Fetching deal ID: %s", deal_id)
         
         try:
             response = self._make_request("GET", url, params=params)
-            data = response.json()
+            data = _parse_json(response)
             
-            logger.info(f"Retrieved deal: {data.get('properties', {}).get('dealname', 'N/A')}")
+            logger.info("Retrieved deal: %s", data.get('properties', {}).get('dealname', 'N/A'))
             return data
             
         except HubSpotAPIError as e:
-            logger.error(f"Failed to fetch deal {deal_id}: {e}")
+            logger.error("Failed to fetch deal %s: %s", deal_id, e)
             raise
     
-    def get_all_deals(self, 
-                      properties: Optional[List[str]] = None,
-                      archived: bool = False,
-                      batch_size: int = 100) -> List[Dict[str, Any]]:
+    def search_deals(self,
+                     filter_groups: List[Dict[str, Any]],
+                     properties: Optional[List[str]] = None,
+                     sorts: Optional[List[Dict[str, str]]] = None,
+                     after: Optional[str] = None,
+                     limit: int = 100) -> Dict[str, Any]:
         """
-        Get all deals using pagination
+        Search deals with server-side filtering
+        
+        Args:
+            filter_groups: HubSpot ``filterGroups`` (OR of ANDed filters)
+            properties: List of deal properties to retrieve
+            sorts: HubSpot sort specifications
+            after: Pagination offset from previous response
+            limit: Number of deals per request (max 200)
+            
+        Returns:
+            Dict containing:
+                - total: Number of matching deals
+                - results: List of deal objects
+                - paging: Pagination info (if more results available)
+                
+        Raises:
+            HubSpotAPIError: If API request fails
+        """
+        if limit > SEARCH_MAX_PAGE_SIZE:
+            logger.warning("Limit %s exceeds max %s, setting to %s",
+                           limit, SEARCH_MAX_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+            limit = SEARCH_MAX_PAGE_SIZE
+        
+        payload = {
+            "filterGroups": filter_groups,
+            "limit": limit
+        }
+        
+        if properties:
+            payload["properties"] = list(properties)
+        
+        if sorts:
+            payload["sorts"] = sorts
+        
+        if after:
+            payload["after"] = after
+        
+        logger.info("Searching deals - Limit: %s, After: %s", limit, after)
+        
+        try:
+            response = self._make_request(
+                "POST",
+                self._deals_search_url,
+                request_times=self._search_request_times,
+                data=orjson.dumps(payload)
+            )
+            data = _parse_json(response)
+            
+            results_count = len(data.get("results", []))
+            logger.info("Retrieved %s of %s matching deals", results_count, data.get('total', 0))
+            
+            return data
+            
+        except HubSpotAPIError as e:
+            logger.error("Failed to search deals: %s", e)
+            raise
+    
+    def batch_read_deals(self,
+                         ids: List[str],
+                         properties: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get up to 100 deals by ID in a single request
+        
+        Args:
+            ids: HubSpot deal IDs (max 100)
+            properties: List of properties to retrieve
+            
+        Returns:
+            List of deal objects
+            
+        Raises:
+            HubSpotAPIError: If API request fails
+        """
+        if len(ids) > BATCH_READ_MAX_INPUTS:
+            raise ValueError(f"Batch read accepts at most {BATCH_READ_MAX_INPUTS} ids, got {len(ids)}")
+        
+        payload = {"inputs": [{"id": deal_id} for deal_id in ids]}
+        if properties:
+            payload["properties"] = list(properties)
+        
+        logger.info("Batch reading %s deals", len(ids))
+        
+        try:
+            response = self._make_request("POST", self._deals_batch_read_url, data=orjson.dumps(payload))
+            data = _parse_json(response)
+            
+            return data.get("results", [])
+            
+        except HubSpotAPIError as e:
+            logger.error("Failed to batch read deals: %s", e)
+            raise
+    
+    def iter_deal_pages(self,
+                        properties: Optional[List[str]] = None,
+                        archived: bool = False,
+                        batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all pages of deals, prefetching the next page
+        
+        HubSpot cursor paging only reveals the next ``after`` token once a
+        page has been received, so pages cannot be fetched out of order.
+        Instead, the request for page N+1 is issued on a background thread
+        as soon as page N arrives, overlapping the network round-trip with
+        whatever the caller does with page N.
         
         Args:
             properties: List of deal properties to retrieve
             archived: Whether to include archived deals
             batch_size: Number of deals per API request
             
-        Returns:
-            List of all deal objects
+        Yields:
+            Raw page responses as returned by ``get_deals``
             
         Raises:
             HubSpotAPIError: If API requests fail
         """
-        all_deals = []
+        # Join once instead of on every page request
+        if properties:
+            properties = ",".join(properties)
+        
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="hubspot-prefetch") as executor:
+            future = executor.submit(
+                self.get_deals,
+                limit=batch_size,
+                properties=properties,
+                archived=archived
+            )
+            
+            while True:
+                data = future.result()
+                
+                # Kick off the next page before handing this one to the caller
+                next_page = data.get("paging", {}).get("next")
+                if next_page:
+                    future = executor.submit(
+                        self.get_deals,
+                        limit=batch_size,
+                        after=next_page["after"],
+                        properties=properties,
+                        archived=archived
+                    )
+                
+                yield data
+                
+                if not next_page:
+                    break
+    
+    def iter_modified_deal_pages(self,
+                                 since: str,
+                                 properties: Optional[List[str]] = None,
+                                 batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over pages of deals modified after a watermark
+        
+        Uses the Search API so only changed deals are transferred. A single
+        search can only page through ``SEARCH_RESULT_LIMIT`` results, so when
+        more deals than that have changed it switches to a two-phase pull:
+        a light enumeration of ids and modification dates, followed by
+        concurrent batch reads of just the changed deals.
+        
+        Args:
+            since: ISO 8601 ``hs_lastmodifieddate`` watermark (exclusive)
+            properties: List of deal properties to retrieve
+            batch_size: Number of deals per API request (max 200)
+            
+        Yields:
+            Pages of the form ``{"results": [...]}``
+            
+        Raises:
+            HubSpotAPIError: If API requests fail
+        """
+        filter_groups = [{
+            "filters": [{
+                "propertyName": "hs_lastmodifieddate",
+                "operator": "GT",
+                "value": since
+            }]
+        }]
+        # Page in id order: sorting on the modification date would let a deal
+        # edited mid-scan jump to the end and shift an unread one past the
+        # page boundary. With a fixed key, edits only cause harmless re-reads.
+        sorts = [{"propertyName": "hs_object_id", "direction": "ASCENDING"}]
         after = None
+        
+        while True:
+            data = self.search_deals(
+                filter_groups=filter_groups,
+                properties=properties,
+                sorts=sorts,
+                after=after,
+                limit=batch_size
+            )
+            
+            if after is None and data.get("total", 0) > SEARCH_RESULT_LIMIT:
+                logger.info("%s modified deals exceed the search limit, "
+                            "switching to id enumeration + batch read", data['total'])
+                ids = self.get_modified_deal_ids(since)
+                yield from self.iter_deals_by_ids(ids, properties=properties)
+                return
+            
+            yield data
+            
+            next_page = data.get("paging", {}).get("next")
+            if not next_page:
+                break
+            
+            after = next_page["after"]
+    
+    def get_modified_deal_ids(self, since: str, batch_size: int = 100) -> List[str]:
+        """
+        Enumerate ids of deals modified after a watermark
+        
+        Walks the deals list requesting only ``hs_lastmodifieddate``, so pages
+        are a fraction of the size of a full-property pull.
+        
+        Args:
+            since: ISO 8601 ``hs_lastmodifieddate`` watermark (exclusive)
+            batch_size: Number of deals per API request
+            
+        Returns:
+            List of deal IDs
+            
+        Raises:
+            HubSpotAPIError: If API requests fail
+        """
+        ids = []
+        for data in self.iter_deal_pages(properties=["hs_lastmodifieddate"], batch_size=batch_size):
+            for deal in data.get("results", []):
+                modified = deal.get("properties", {}).get("hs_lastmodifieddate")
+                if modified and modified > since:
+                    ids.append(deal["id"])
+        
+        logger.info("Found %s deals modified after %s", len(ids), since)
+        return ids
+    
+    def iter_deals_by_ids(self,
+                          ids: List[str],
+                          properties: Optional[List[str]] = None,
+                          max_workers: int = 4) -> Iterator[Dict[str, Any]]:
+        """
+        Fetch deals by ID with concurrent batch reads
+        
+        Args:
+            ids: HubSpot deal IDs
+            properties: List of properties to retrieve
+            max_workers: Number of batch reads in flight at once (the shared
+                rate limiter still caps the overall request rate)
+            
+        Yields:
+            Pages of the form ``{"results": [...]}``, in id order
+            
+        Raises:
+            HubSpotAPIError: If API requests fail
+        """
+        chunks = (ids[i:i + BATCH_READ_MAX_INPUTS] for i in range(0, len(ids), BATCH_READ_MAX_INPUTS))
+        
+        # Bound the read-ahead so memory tracks a few pages, not the whole
+        # change set, when the caller consumes slower than we fetch
+        max_in_flight = max_workers * 2
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hubspot-batch-read") as executor:
+            in_flight = deque()
+            for chunk in chunks:
+                in_flight.append(executor.submit(self.batch_read_deals, chunk, properties))
+                if len(in_flight) >= max_in_flight:
+                    yield {"results": in_flight.popleft().result()}
+            
+            while in_flight:
+                yield {"results": in_flight.popleft().result()}
+    
+    def iter_all_deals(self,
+                       properties: Optional[List[str]] = None,
+                       archived: bool = False,
+                       batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all deals using pagination
+        
+        Only the current page is held in memory, so this is the way to walk
+        large portals.
+        
+        Args:
+            properties: List of deal properties to retrieve
+            archived: Whether to include archived deals
+            batch_size: Number of deals per API request
+            
+        Yields:
+            Deal objects
+            
+        Raises:
+            HubSpotAPIError: If API requests fail
+        """
         page = 1
+        total = 0
         
         logger.info("Starting full deals extraction...")
         
-        while True:
-            try:
-                data = self.get_deals(
-                    limit=batch_size,
-                    after=after,
-                    properties=properties,
-                    archived=archived
-                )
-                
+        try:
+            for data in self.iter_deal_pages(
+                properties=properties,
+                archived=archived,
+                batch_size=batch_size
+            ):
                 results = data.get("results", [])
-                all_deals.extend(results)
-                
-                logger.info(f"Page {page}: Retrieved {len(results)} deals. Total: {len(all_deals)}")
-                
-                # Check if there are more pages
-                paging = data.get("paging", {})
-                if "next" not in paging:
-                    logger.info(f"✅ Extraction complete. Total deals: {len(all_deals)}")
-                    break
+                total += len(results)
                 
-                # Get next page cursor
-                after = paging["next"]["after"]
+                logger.info("Page %s: Retrieved %s deals. Total: %s", page, len(results), total)
                 page += 1
                 
-            except HubSpotAPIError as e:
-                logger.error(f"Error during full extraction on page {page}: {e}")
-                raise
+                yield from results
+                
+        except HubSpotAPIError as e:
+            logger.error("Error during full extraction on page %s: %s", page, e)
+            raise
         
-        return all_deals
+        logger.info("✅ Extraction complete. Total deals: %s", total)
+    
+    def get_all_deals(self, 
+                      properties: Optional[List[str]] = None,
+                      archived: bool = False,
+                      batch_size: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get all deals using pagination
+        
+        Args:
+            properties: List of deal properties to retrieve
+            archived: Whether to include archived deals
+            batch_size: Number of deals per API request
+            
+        Returns:
+            List of all deal objects
+            
+        Raises:
+            HubSpotAPIError: If API requests fail
+        """
+        return list(self.iter_all_deals(
+            properties=properties,
+            archived=archived,
+            batch_size=batch_size
+        ))
     
     def get_deal_properties(self) -> List[Dict[str, Any]]:
         """
         Get all available deal properties and their metadata
         
+        The result is cached on the service instance, so repeated calls
+        during a run do not hit the API again. With ``properties_cache_path``
+        set, the last response is also kept on disk with its ETag and
+        revalidated with If-None-Match; a 304 reuses the stored copy instead
+        of downloading it again.
+        
         Returns:
             List of property definitions
             
         Raises:
             HubSpotAPIError: If API request fails
         """
-        url = f"{self.api_base_url}/crm/{self.api_version}/properties/deals"
+        if self._deal_properties is not None:
+            return self._deal_properties
         
         logger.info("Fetching deal properties metadata...")
         
+        cached = self._load_cached_deal_properties()
+        headers = {"If-None-Match": cached["etag"]} if cached else None
+        
         try:
-            response = self._make_request("GET", url)
-            data = response.json()
+            response = self._make_request("GET", self._deal_properties_url, headers=headers)
             
-            results = data.get("results", [])
-            logger.info(f"Retrieved {len(results)} deal properties")
+            if response.status_code == 304 and cached:
+                results = cached["results"]
+                logger.info("Deal properties unchanged, using %s cached properties", len(results))
+            else:
+                data = _parse_json(response)
+                results = data.get("results", [])
+                logger.info("Retrieved %s deal properties", len(results))
+                
+                etag = response.headers.get("ETag")
+                if etag:
+                    self._store_cached_deal_properties(etag, results)
             
+            self._deal_properties = results
             return results
             
         except HubSpotAPIError as e:
-            logger.error(f"Failed to fetch deal properties: {e}")
+            logger.error("Failed to fetch deal properties: %s", e)
             raise
     
+    def _read_properties_cache_file(self) -> Dict[str, Any]:
+        """Read the whole properties cache file, or {} if missing/unreadable"""
+        try:
+            with open(self.properties_cache_path, "rb") as f:
+                entries = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+    
+    def _load_cached_deal_properties(self) -> Optional[Dict[str, Any]]:
+        """
+        Look up this token's stored deal properties response
+        
+        Returns:
+            Dict with "etag" and "results", or None if nothing usable is stored
+        """
+        if not self.properties_cache_path:
+            return None
+        
+        entry = self._read_properties_cache_file().get(self._token_hash)
+        if isinstance(entry, dict) and entry.get("etag") and isinstance(entry.get("results"), list):
+            return entry
+        return None
+    
+    def _store_cached_deal_properties(self, etag: str, results: List[Dict[str, Any]]):
+        """
+        Persist the deal properties response and its ETag for the next run
+        
+        Failures are logged and ignored: the cache is only an optimisation.
+        
+        Args:
+            etag: ETag header of the response
+            results: Property definitions from the response
+        """
+        if not self.properties_cache_path:
+            return
+        
+        entries = self._read_properties_cache_file()
+        entries[self._token_hash] = {"etag": etag, "results": results}
+        
+        # Write to a temp file and swap it in so readers never see a partial file
+        tmp_path = f"{self.properties_cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.properties_cache_path) or ".", exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps(entries))
+            os.replace(tmp_path, self.properties_cache_path)
+        except OSError as e:
+            logger.warning("Could not write deal properties cache %s: %s",
+                           self.properties_cache_path, e)
+    
     def close(self):
         """Close the session"""
         if self.session:
             self.session.close()
             logger.info("HubSpot API Service session closed")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
 
 
 # Convenience function for testing
-def test_connection(access_token: str) -> bool:
+def test_connection(access_token: str, cache_name: Optional[str] = None) -> bool:
     """
     Test HubSpot API connection
     
     Args:
         access_token: HubSpot access token
+        cache_name: Optional SQLite file for the on-disk response cache
         
     Returns:
         True if connection successful
     """
     try:
-        service = HubSpotAPIService(access_token)
-        result = service.verify_credentials()
-        service.close()
-        return result
+        with HubSpotAPIService(access_token, cache_name=cache_name) as service:
+            return service.verify_credentials()
     except Exception as e:
-        logger.error(f"Connection test failed: {e}")
+        logger.error("Connection test failed: %s", e)
         return False
\ No newline at end of file
@@ -5,122 +5,256 @@ This module implements the DLT data source for extracting HubSpot deals.
 """
 
 import dlt
-from typing import Iterator, Dict, Any, Optional, List
-from datetime import datetime, timezone
+import sys
+from typing import Callable, Iterator, Dict, Any, Optional, List
+from datetime import datetime, timedelta, timezone
 import logging
 
 from services.api_service import HubSpotAPIService, HubSpotAPIError
 
 logger = logging.getLogger(__name__)
 
+# Watermark used by the first incremental scan (i.e. everything)
+INITIAL_WATERMARK = "1970-01-01T00:00:00Z"
 
-def transform_deal(deal: Dict[str, Any], 
-                   tenant_id: str, 
-                   scan_id: str,
-                   extracted_at: datetime) -> Dict[str, Any]:
+# Overlap subtracted from the scan start when storing the watermark, to
+# absorb clock skew between us and HubSpot (merge makes re-reads harmless)
+WATERMARK_LOOKBACK = timedelta(minutes=10)
+
+# HubSpot properties already mapped to flat columns by the deal transform
+FLAT_PROPERTY_KEYS = frozenset({
+    "dealname",
+    "amount",
+    "deal_currency_code",
+    "dealstage",
+    "dealtype",
+    "pipeline",
+    "description",
+    "hubspot_owner_id",
+    "num_associated_contacts",
+    "num_associated_companies",
+    "hs_forecast_amount",
+    "hs_forecast_probability",
+    "hs_is_closed_won",
+    "hs_is_closed_lost",
+    "hs_priority",
+    "closedate",
+    "createdate",
+    "hs_lastmodifieddate",
+})
+
+
+# Column types for the deals table. Declaring them up front means DLT does
+# not have to infer types from the data on every load.
+DEAL_COLUMNS = {
+    "deal_id": {"data_type": "text", "nullable": False},
+    "hs_object_id": {"data_type": "text"},
+    "deal_name": {"data_type": "text"},
+    "amount": {"data_type": "double"},
+    "currency": {"data_type": "text"},
+    "dealstage": {"data_type": "text"},
+    "dealtype": {"data_type": "text"},
+    "pipeline": {"data_type": "text"},
+    "description": {"data_type": "text"},
+    "owner_id": {"data_type": "text"},
+    "hubspot_owner_id": {"data_type": "text"},
+    "num_associated_contacts": {"data_type": "bigint"},
+    "num_associated_companies": {"data_type": "bigint"},
+    "hs_forecast_amount": {"data_type": "double"},
+    "hs_forecast_probability": {"data_type": "double"},
+    "is_archived": {"data_type": "bool"},
+    "archived": {"data_type": "bool"},
+    "hs_is_closed_won": {"data_type": "bool"},
+    "hs_is_closed_lost": {"data_type": "bool"},
+    "hs_priority": {"data_type": "text"},
+    "close_date": {"data_type": "timestamp"},
+    "createdate": {"data_type": "timestamp"},
+    "hs_lastmodifieddate": {"data_type": "timestamp"},
+    "created_at": {"data_type": "timestamp"},
+    "updated_at": {"data_type": "timestamp"},
+    "raw_properties": {"data_type": "json"},
+    "extracted_at": {"data_type": "timestamp"},
+    "_tenant_id": {"data_type": "text"},
+    "_extracted_at": {"data_type": "timestamp"},
+    "_scan_id": {"data_type": "text"},
+    "_source_system": {"data_type": "text"},
+    "_api_version": {"data_type": "text"},
+    "_is_deleted": {"data_type": "bool"},
+}
+
+
+def _to_numeric(value: Any) -> Optional[float]:
+    """Safely convert a HubSpot property value to float"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_boolean(value: Any) -> Optional[bool]:
+    """Safely convert a HubSpot property value to bool"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == "true"
+
+
+def _intern(value: Any) -> Any:
     """
-    Transform HubSpot deal to database format
+    Intern low-cardinality string values (stage, pipeline, currency, ...)
+    
+    Each parsed JSON value is a new string object; interning lets every
+    record share a single copy of e.g. "closedwon" or "default".
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _to_datetime(value: Any) -> Optional[str]:
+    """Normalize empty HubSpot datetime values (already ISO 8601) to None"""
+    if value is None or value == "":
+        return None
+    return value
+
+
+def _format_watermark(value: datetime) -> str:
+    """Format a timestamp like HubSpot's hs_lastmodifieddate (UTC, milliseconds)"""
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def make_deal_transformer(tenant_id: str,
+                          scan_id: str,
+                          extracted_at: datetime,
+                          store_raw: bool = False) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Build a deal transform specialised to one extraction run
+    
+    Everything that is constant for the run (ETL metadata, timestamp
+    formatting, the store_raw branch) is evaluated once here, so the
+    returned function only does per-deal work.
     
     Args:
-        deal: Raw deal object from HubSpot API
         tenant_id: Tenant identifier
         scan_id: Scan batch identifier
         extracted_at: Extraction timestamp
+        store_raw: Keep properties not mapped to flat columns in raw_properties
         
     Returns:
-        Transformed deal record
+        Function mapping a raw HubSpot deal to a transformed record
     """
-    properties = deal.get("properties", {})
-    
-    # Helper function to safely get numeric values
-    def get_numeric(value):
-        if value is None or value == "":
-            return None
-        try:
-            return float(value)
-        except (ValueError, TypeError):
-            return None
-    
-    # Helper function to safely get boolean values
-    def get_boolean(value):
-        if value is None or value == "":
-            return None
-        if isinstance(value, bool):
-            return value
-        return str(value).lower() == "true"
-    
-    # Helper function to safely get datetime values
-    def get_datetime(value):
-        if value is None or value == "":
-            return None
-        try:
-            # HubSpot returns ISO 8601 format
-            return value
-        except:
-            return None
-    
-    # Build transformed record
-    transformed = {
-        # Primary identifiers
-        "deal_id": deal.get("id"),
-        "hs_object_id": deal.get("id"),
-        
-        # Core deal information
-        "deal_name": properties.get("dealname"),
-        "amount": get_numeric(properties.get("amount")),
-        "currency": properties.get("deal_currency_code", "USD"),
-        "dealstage": properties.get("dealstage"),
-        "dealtype": properties.get("dealtype"),
-        "pipeline": properties.get("pipeline"),
-        "description": properties.get("description"),
-        
-        # Owner & Assignment
-        "owner_id": properties.get("hubspot_owner_id"),
-        "hubspot_owner_id": properties.get("hubspot_owner_id"),
-        
-        # Deal Metrics
-        "num_associated_contacts": int(properties.get("num_associated_contacts", 0) or 0),
-        "num_associated_companies": int(properties.get("num_associated_companies", 0) or 0),
-        "hs_forecast_amount": get_numeric(properties.get("hs_forecast_amount")),
-        "hs_forecast_probability": get_numeric(properties.get("hs_forecast_probability")),
-        
-        # Status Flags
-        "is_archived": deal.get("archived", False),
-        "archived": deal.get("archived", False),
-        "hs_is_closed_won": get_boolean(properties.get("hs_is_closed_won")),
-        "hs_is_closed_lost": get_boolean(properties.get("hs_is_closed_lost")),
-        
-        # Priority
-        "hs_priority": properties.get("hs_priority"),
-        
-        # Dates & Timestamps
-        "close_date": get_datetime(properties.get("closedate")),
-        "createdate": get_datetime(properties.get("createdate")),
-        "hs_lastmodifieddate": get_datetime(properties.get("hs_lastmodifieddate")),
-        "created_at": deal.get("createdAt"),
-        "updated_at": deal.get("updatedAt"),
-        
-        # Raw data storage
-        "raw_properties": properties,
-        
-        # ETL Metadata (CRITICAL)
-        "extracted_at": extracted_at.isoformat(),
+    extracted_at_iso = extracted_at.isoformat()
+    metadata = {
+        "extracted_at": extracted_at_iso,
         "_tenant_id": tenant_id,
-        "_extracted_at": extracted_at.isoformat(),
+        "_extracted_at": extracted_at_iso,
         "_scan_id": scan_id,
         "_source_system": "hubspot",
         "_api_version": "v3",
         "_is_deleted": False,
     }
     
-    return transformed
+    def transform(deal: Dict[str, Any]) -> Dict[str, Any]:
+        properties = deal.get("properties", {})
+        
+        # Bind lookups once; each value is read only once below
+        get = properties.get
+        deal_id = deal.get("id")
+        owner_id = get("hubspot_owner_id")
+        archived = deal.get("archived", False)
+        
+        # Build transformed record
+        transformed = {
+            # Primary identifiers
+            "deal_id": deal_id,
+            "hs_object_id": deal_id,
+            
+            # Core deal information
+            "deal_name": get("dealname"),
+            "amount": _to_numeric(get("amount")),
+            "currency": _intern(get("deal_currency_code", "USD")),
+            "dealstage": _intern(get("dealstage")),
+            "dealtype": _intern(get("dealtype")),
+            "pipeline": _intern(get("pipeline")),
+            "description": get("description"),
+            
+            # Owner & Assignment
+            "owner_id": owner_id,
+            "hubspot_owner_id": owner_id,
+            
+            # Deal Metrics
+            "num_associated_contacts": int(get("num_associated_contacts", 0) or 0),
+            "num_associated_companies": int(get("num_associated_companies", 0) or 0),
+            "hs_forecast_amount": _to_numeric(get("hs_forecast_amount")),
+            "hs_forecast_probability": _to_numeric(get("hs_forecast_probability")),
+            
+            # Status Flags
+            "is_archived": archived,
+            "archived": archived,
+            "hs_is_closed_won": _to_boolean(get("hs_is_closed_won")),
+            "hs_is_closed_lost": _to_boolean(get("hs_is_closed_lost")),
+            
+            # Priority
+            "hs_priority": _intern(get("hs_priority")),
+            
+            # Dates & Timestamps
+            "close_date": _to_datetime(get("closedate")),
+            "createdate": _to_datetime(get("createdate")),
+            "hs_lastmodifieddate": _to_datetime(get("hs_lastmodifieddate")),
+            "created_at": deal.get("createdAt"),
+            "updated_at": deal.get("updatedAt"),
+        }
+        
+        # ETL Metadata (CRITICAL)
+        transformed.update(metadata)
+        
+        # Raw data storage (opt-in, only what the flat columns don't already hold)
+        if store_raw:
+            transformed["raw_properties"] = {
+                k: v for k, v in properties.items() if k not in FLAT_PROPERTY_KEYS
+            }
+        
+        return transformed
+    
+    return transform
+
+
+def transform_deal(deal: Dict[str, Any], 
+                   tenant_id: str, 
+                   scan_id: str,
+                   extracted_at: datetime,
+                   store_raw: bool = False) -> Dict[str, Any]:
+    """
+    Transform HubSpot deal to database format
+    
+    For more than one deal, build the transform once with
+    ``make_deal_transformer`` instead.
+    
+    Args:
+        deal: Raw deal object from HubSpot API
+        tenant_id: Tenant identifier
+        scan_id: Scan batch identifier
+        extracted_at: Extraction timestamp
+        store_raw: Keep properties not mapped to flat columns in raw_properties
+        
+    Returns:
+        Transformed deal record
+    """
+    return make_deal_transformer(tenant_id, scan_id, extracted_at, store_raw)(deal)
 
 
 @dlt.resource(
     name="deals",
     write_disposition="merge",
     primary_key="deal_id",
-    merge_key="deal_id"
+    merge_key="deal_id",
+    columns=DEAL_COLUMNS,
+    # Values that don't fit the declared types fail the load instead of
+    # silently creating variant columns
+    schema_contract={"data_type": "freeze"}
 )
 def extract_deals(
     access_token: str,
@@ -129,11 +263,20 @@ def extract_deals(
     properties: Optional[List[str]] = None,
     archived: bool = False,
     batch_size: int = 100,
-    checkpoint_interval: int = 50
-) -> Iterator[Dict[str, Any]]:
+    store_raw: bool = False,
+    scan_type: str = "full"
+) -> Iterator[List[Dict[str, Any]]]:
     """
     DLT resource for extracting HubSpot deals
     
+    Full scans page through every deal. Incremental scans use the Search
+    API to fetch only deals whose ``hs_lastmodifieddate`` is newer than the
+    watermark kept in DLT resource state (archived deals are not
+    searchable); until a watermark exists they list deals like a full
+    scan. Both scan types set the watermark to the scan start minus
+    ``WATERMARK_LOOKBACK``: deals read early can change while later pages
+    are fetched, so nothing newer than the start is safe to skip.
+    
     Args:
         access_token: HubSpot Private App access token
         tenant_id: Tenant/organization identifier
@@ -141,83 +284,87 @@ def extract_deals(
         properties: List of deal properties to extract
         archived: Whether to include archived deals
         batch_size: Number of deals per API request
-        checkpoint_interval: Save checkpoint every N deals
+        store_raw: Store unmapped HubSpot properties in raw_properties
+        scan_type: Type of scan (full or incremental)
         
     Yields:
-        Transformed deal records
+        Lists of transformed deal records, one list per API page
     """
-    logger.info(f"Starting deals extraction - Tenant: {tenant_id}, Scan: {scan_id}")
+    logger.info("Starting deals extraction - Tenant: %s, Scan: %s", tenant_id, scan_id)
     
-    # Initialize API service
+    # Initialize API service (no credentials pre-flight: an invalid token
+    # fails the first page request with an authentication HubSpotAPIError)
     service = HubSpotAPIService(access_token)
     
-    # Verify credentials
-    if not service.verify_credentials():
-        raise HubSpotAPIError("Invalid HubSpot credentials")
-    
     # Extraction metadata
     extracted_at = datetime.now(timezone.utc)
-    after_cursor = None
+    transform = make_deal_transformer(tenant_id, scan_id, extracted_at, store_raw)
     page = 1
     total_deals = 0
     
+    # Watermark persisted by DLT between runs
+    state = dlt.current.resource_state()
+    last_modified = state.setdefault("last_modified", INITIAL_WATERMARK)
+    
+    if scan_type == "incremental" and last_modified != INITIAL_WATERMARK:
+        logger.info("Incremental scan - deals modified after %s", last_modified)
+        pages = service.iter_modified_deal_pages(
+            since=last_modified,
+            properties=properties,
+            batch_size=batch_size
+        )
+    else:
+        if scan_type == "incremental":
+            # Every deal matches the initial watermark; listing them is much
+            # cheaper than the search limit's id enumeration + batch reads
+            logger.info("Incremental scan without a watermark - reading all deals")
+        
+        # Pages are prefetched one ahead, so the next HubSpot request is in
+        # flight while this page is transformed and handed to DLT
+        pages = service.iter_deal_pages(
+            properties=properties,
+            archived=archived,
+            batch_size=batch_size
+        )
+    
     try:
-        while True:
-            logger.info(f"Fetching page {page} (batch size: {batch_size})")
-            
-            # Get deals from HubSpot
-            data = service.get_deals(
-                limit=batch_size,
-                after=after_cursor,
-                properties=properties,
-                archived=archived
-            )
+        for data in pages:
+            logger.info("Processing page %s (batch size: %s)", page, batch_size)
             
             results = data.get("results", [])
             
             if not results:
-                logger.info("No more deals to extract")
-                break
-            
-            # Transform and yield deals
-            for deal in results:
-                transformed = transform_deal(
-                    deal=deal,
-                    tenant_id=tenant_id,
-                    scan_id=scan_id,
-                    extracted_at=extracted_at
-                )
-                
-                total_deals += 1
-                
-                # Yield transformed deal
-                yield transformed
-                
-                # Checkpoint logging
-                if total_deals % checkpoint_interval == 0:
-                    logger.info(f"Checkpoint: {total_deals} deals extracted")
+                logger.info("Page %s: no deals", page)
+                continue
             
-            logger.info(f"Page {page}: Extracted {len(results)} deals. Total: {total_deals}")
+            # Transform and yield the whole page; DLT treats each list
+            # element as a row and batches them without per-item overhead
+            deals = [transform(deal) for deal in results]
+            total_deals += len(deals)
             
-            # Check for more pages
-            paging = data.get("paging", {})
-            if "next" not in paging:
-                logger.info(f"✅ Extraction complete. Total deals: {total_deals}")
-                break
+            yield deals
             
-            # Get next page cursor
-            after_cursor = paging["next"]["after"]
+            logger.info("Page %s: Extracted %s deals. Total: %s", page, len(results), total_deals)
             page += 1
+        
+        # Only advance the watermark once every page has been read
+        state["last_modified"] = _format_watermark(extracted_at - WATERMARK_LOOKBACK)
+        logger.info("Watermark: %s", state["last_modified"])
+        
+        logger.info("✅ Extraction complete. Total deals: %s", total_deals)
             
     except HubSpotAPIError as e:
-        logger.error(f"HubSpot API error during extraction: {e}")
+        logger.error("HubSpot API error during extraction: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Unexpected error during extraction: {e}", exc_info=True)
+        logger.error("Unexpected error during extraction: %s", e, exc_info=True)
         raise
     finally:
+        # Shut down the page generator (and its prefetch thread) first so no
+        # request is issued on the closed session
+        pages.close()
         service.close()
-        logger.info(f"Extraction session closed. Extracted {total_deals} deals")
+        logger.info("Extraction session closed. Extracted %s deals", total_deals)
 
 
 @dlt.source
@@ -227,7 +374,9 @@ def hubspot_deals_source(
     scan_id: Optional[str] = None,
     properties: Optional[List[str]] = None,
     archived: bool = False,
-    batch_size: int = 100
+    batch_size: int = 100,
+    store_raw: bool = False,
+    scan_type: str = "full"
 ):
     """
     DLT source for HubSpot deals extraction
@@ -239,6 +388,8 @@ def hubspot_deals_source(
         properties: List of deal properties to extract
         archived: Whether to include archived deals
         batch_size: Number of deals per API request
+        store_raw: Store unmapped HubSpot properties in raw_properties
+        scan_type: Type of scan (full or incremental)
         
     Returns:
         DLT source with deals resource
@@ -247,7 +398,7 @@ def hubspot_deals_source(
     if not scan_id:
         scan_id = f"scan_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
     
-    logger.info(f"Initializing HubSpot Deals source - Scan ID: {scan_id}")
+    logger.info("Initializing HubSpot Deals source - Scan ID: %s", scan_id)
     
     # Default properties if not specified
     if not properties:
@@ -278,14 +429,16 @@ def hubspot_deals_source(
         scan_id=scan_id,
         properties=properties,
         archived=archived,
-        batch_size=batch_size
+        batch_size=batch_size,
+        store_raw=store_raw,
+        scan_type=scan_type
     )
 
 
 # Convenience function for testing
 def test_extraction(access_token: str, 
                    tenant_id: str = "test", 
-                   limit: int = 10) -> List[Dict[str, Any]]:
+                   limit: int = 10) -> Iterator[Dict[str, Any]]:
     """
     Test extraction without DLT pipeline
     
@@ -294,34 +447,22 @@ def test_extraction(access_token: str,
         tenant_id: Tenant identifier
         limit: Maximum number of deals to extract
         
-    Returns:
-        List of extracted deals
+    Yields:
+        Transformed deals, one at a time
     """
-    logger.info(f"Starting test extraction (limit: {limit})")
+    logger.info("Starting test extraction (limit: %s)", limit)
     
     scan_id = f"test_scan_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
     extracted_at = datetime.now(timezone.utc)
     
-    service = HubSpotAPIService(access_token)
-    
-    try:
+    with HubSpotAPIService(access_token) as service:
         # Get deals
         data = service.get_deals(limit=limit)
         results = data.get("results", [])
         
-        # Transform deals
-        transformed_deals = []
+        # Transform deals lazily so callers don't hold the whole batch
+        transform = make_deal_transformer(tenant_id, scan_id, extracted_at)
         for deal in results:
-            transformed = transform_deal(
-                deal=deal,
-                tenant_id=tenant_id,
-                scan_id=scan_id,
-                extracted_at=extracted_at
-            )
-            transformed_deals.append(transformed)
+            yield transform(deal)
         
-        logger.info(f"✅ Test extraction complete: {len(transformed_deals)} deals")
-        return transformed_deals
-        
-    finally:
-        service.close()
\ No newline at end of file
+        logger.info("✅ Test extraction complete: %s deals", len(results))
\ No newline at end of file
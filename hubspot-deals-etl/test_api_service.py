@@ -2,8 +2,11 @@
 
 import os
 import logging
-from dotenv import load_dotenv
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from services.api_service import HubSpotAPIService, test_connection
+from local_env import get_access_token
 
 # Setup logging
 logging.basicConfig(
@@ -11,132 +14,165 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-load_dotenv()
+BANNER_LINE = "=" * 60
+SECTION_LINE = "-" * 60
 
 def main():
     """Test HubSpot API Service"""
     
     # Get token from environment
-    access_token = os.getenv("HUBSPOT_ACCESS_TOKEN")
+    access_token = get_access_token()
+    
+    # Optional on-disk response cache to speed up repeated local runs
+    cache_name = os.getenv("HUBSPOT_HTTP_CACHE")
+    # Optional ETag-revalidated copy of the deal properties (unused with the above)
+    properties_cache_path = os.getenv("HUBSPOT_PROPERTIES_CACHE")
     
     if not access_token:
         print("❌ HUBSPOT_ACCESS_TOKEN not found in .env file")
         return
     
-    print("=" * 60)
+    print(BANNER_LINE)
     print("HUBSPOT API SERVICE TEST")
-    print("=" * 60)
-    
-    # Test 1: Connection test
-    print("\n📡 Test 1: Connection Test")
-    print("-" * 60)
-    success = test_connection(access_token)
-    if success:
-        print("✅ Connection test PASSED")
-    else:
-        print("❌ Connection test FAILED")
-        return
+    print(BANNER_LINE)
     
-    # Test 2: Initialize service
-    print("\n🔧 Test 2: Initialize Service")
-    print("-" * 60)
     try:
-        service = HubSpotAPIService(access_token)
-        print("✅ Service initialized successfully")
+        service = HubSpotAPIService(
+            access_token,
+            cache_name=cache_name,
+            properties_cache_path=properties_cache_path
+        )
+        service_error = None
     except Exception as e:
-        print(f"❌ Service initialization failed: {e}")
-        return
-    
-    # Test 3: Verify credentials
-    print("\n🔐 Test 3: Verify Credentials")
-    print("-" * 60)
-    if service.verify_credentials():
-        print("✅ Credentials verified")
-    else:
-        print("❌ Credentials verification failed")
-        return
+        service, service_error = None, e
     
-    # Test 4: Get deals (first page)
-    print("\n📥 Test 4: Get Deals (First Page)")
-    print("-" * 60)
-    try:
-        data = service.get_deals(limit=10)
-        deals = data.get("results", [])
-        paging = data.get("paging", {})
+    # The service closes its session on the way out, even on early return or error
+    with service or nullcontext(), ThreadPoolExecutor(max_workers=4) as executor:
+        # Tests 1, 3, 4 and 6 are independent HubSpot requests: start them all
+        # up front and report the results in the usual order
+        connection_future = executor.submit(test_connection, access_token, cache_name)
+        if service:
+            verify_future = executor.submit(service.verify_credentials)
+            # Only the fields Test 4 prints, to keep the payload small
+            deals_future = executor.submit(
+                service.get_deals,
+                limit=10,
+                properties=["dealname", "amount", "dealstage"]
+            )
+            properties_future = executor.submit(service.get_deal_properties)
         
-        print(f"✅ Retrieved {len(deals)} deals")
+        # Test 1: Connection test
+        print("\n📡 Test 1: Connection Test")
+        print(SECTION_LINE)
+        success = connection_future.result()
+        if success:
+            print("✅ Connection test PASSED")
+        else:
+            print("❌ Connection test FAILED")
+            return
         
-        if deals:
-            print("\nFirst deal:")
-            first_deal = deals[0]
-            props = first_deal.get("properties", {})
-            print(f"  - ID: {first_deal.get('id')}")
-            print(f"  - Name: {props.get('dealname', 'N/A')}")
-            print(f"  - Amount: ${props.get('amount', '0')}")
-            print(f"  - Stage: {props.get('dealstage', 'N/A')}")
+        # Test 2: Initialize service
+        print("\n🔧 Test 2: Initialize Service")
+        print(SECTION_LINE)
+        if service_error:
+            print(f"❌ Service initialization failed: {service_error}")
+            return
+        print("✅ Service initialized successfully")
         
-        if "next" in paging:
-            print(f"\n📄 More pages available")
-            print(f"  - Next cursor: {paging['next']['after'][:20]}...")
+        # Test 3: Verify credentials
+        print("\n🔐 Test 3: Verify Credentials")
+        print(SECTION_LINE)
+        if verify_future.result():
+            print("✅ Credentials verified")
         else:
-            print(f"\n✅ No more pages")
-            
-    except Exception as e:
-        print(f"❌ Get deals failed: {e}")
-        return
-    
-    # Test 5: Get all deals
-    print("\n📦 Test 5: Get All Deals")
-    print("-" * 60)
-    try:
-        all_deals = service.get_all_deals(
-            properties=["dealname", "amount", "dealstage", "closedate"],
-            batch_size=100
-        )
+            print("❌ Credentials verification failed")
+            return
         
-        print(f"✅ Retrieved {len(all_deals)} total deals")
+        # Test 4: Get deals (first page)
+        print("\n📥 Test 4: Get Deals (First Page)")
+        print(SECTION_LINE)
+        try:
+            data = deals_future.result()
+            deals = data.get("results", [])
+            paging = data.get("paging", {})
+            
+            print(f"✅ Retrieved {len(deals)} deals")
+            
+            if deals:
+                first_deal = deals[0]
+                props = first_deal.get("properties", {})
+                print("\n".join([
+                    "\nFirst deal:",
+                    f"  - ID: {first_deal.get('id')}",
+                    f"  - Name: {props.get('dealname', 'N/A')}",
+                    f"  - Amount: ${props.get('amount', '0')}",
+                    f"  - Stage: {props.get('dealstage', 'N/A')}",
+                ]))
+            
+            if "next" in paging:
+                print(f"\n📄 More pages available")
+                print(f"  - Next cursor: {paging['next']['after'][:20]}...")
+            else:
+                print(f"\n✅ No more pages")
+                
+        except Exception as e:
+            print(f"❌ Get deals failed: {e}")
+            return
         
-        if all_deals:
-            print("\nDeal Summary:")
-            total_value = sum(float(d.get("properties", {}).get("amount", 0) or 0) for d in all_deals)
-            print(f"  - Total deals: {len(all_deals)}")
-            print(f"  - Total value: ${total_value:,.2f}")
+        # Test 5: Get all deals
+        print("\n📦 Test 5: Get All Deals")
+        print(SECTION_LINE)
+        try:
+            # Stream deals and aggregate in a single pass (one page in memory)
+            total_deals = 0
+            total_value = 0.0
+            stages = Counter()
+            for deal in service.iter_all_deals(
+                properties=["dealname", "amount", "dealstage", "closedate"],
+                batch_size=100
+            ):
+                # HubSpot always returns the properties object
+                props = deal["properties"]
+                total_deals += 1
+                total_value += float(props.get("amount") or 0)
+                stages[props.get("dealstage", "unknown")] += 1
             
-            # Group by stage
-            stages = {}
-            for deal in all_deals:
-                stage = deal.get("properties", {}).get("dealstage", "unknown")
-                stages[stage] = stages.get(stage, 0) + 1
+            print(f"✅ Retrieved {total_deals} total deals")
             
-            print(f"\n  Deals by stage:")
-            for stage, count in sorted(stages.items()):
-                print(f"    - {stage}: {count}")
+            if total_deals:
+                print("\nDeal Summary:")
+                print(f"  - Total deals: {total_deals}")
+                print(f"  - Total value: ${total_value:,.2f}")
                 
-    except Exception as e:
-        print(f"❌ Get all deals failed: {e}")
-        return
-    
-    # Test 6: Get deal properties metadata
-    print("\n📋 Test 6: Get Deal Properties Metadata")
-    print("-" * 60)
-    try:
-        properties = service.get_deal_properties()
-        print(f"✅ Retrieved {len(properties)} deal properties")
+                # Group by stage (heading and table in one write)
+                print("\n".join([
+                    "\n  Deals by stage:",
+                    *(f"    - {stage}: {count}" for stage, count in sorted(stages.items())),
+                ]))
+                    
+        except Exception as e:
+            print(f"❌ Get all deals failed: {e}")
+            return
         
-        # Show first 5 properties
-        print("\nFirst 5 properties:")
-        for prop in properties[:5]:
-            print(f"  - {prop['name']}: {prop['label']} ({prop['type']})")
+        # Test 6: Get deal properties metadata
+        print("\n📋 Test 6: Get Deal Properties Metadata")
+        print(SECTION_LINE)
+        try:
+            properties = properties_future.result()
+            print(f"✅ Retrieved {len(properties)} deal properties")
             
-    except Exception as e:
-        print(f"❌ Get properties failed: {e}")
-    
-    # Cleanup
-    service.close()
+            # Show first 5 properties
+            print("\nFirst 5 properties:")
+            for prop in properties[:5]:
+                print(f"  - {prop['name']}: {prop['label']} ({prop['type']})")
+                
+        except Exception as e:
+            print(f"❌ Get properties failed: {e}")
+        
     
-    print("\n" + "=" * 60)
+    print("\n" + BANNER_LINE)
     print("✅ ALL TESTS COMPLETED")
-    print("=" * 60)
+    print(BANNER_LINE)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,7 @@
 ﻿"""Test HubSpot Deals Data Source"""
 
-import os
-from dotenv import load_dotenv
 from services.data_source import test_extraction, hubspot_deals_source
+from local_env import get_access_token
 import logging
 
 logging.basicConfig(
@@ -10,31 +9,34 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-load_dotenv()
+BANNER_LINE = "=" * 60
+SECTION_LINE = "-" * 60
 
 def main():
     """Test DLT Data Source"""
     
-    access_token = os.getenv("HUBSPOT_ACCESS_TOKEN")
+    access_token = get_access_token()
     
     if not access_token:
         print("❌ HUBSPOT_ACCESS_TOKEN not found")
         return
     
-    print("=" * 60)
+    print(BANNER_LINE)
     print("HUBSPOT DEALS DATA SOURCE TEST")
-    print("=" * 60)
+    print(BANNER_LINE)
     
     # Test 1: Simple extraction (without DLT)
     print("\n📦 Test 1: Simple Extraction (No DLT)")
-    print("-" * 60)
+    print(SECTION_LINE)
     try:
+        # Consume the stream: keep the first deal, count the rest
         deals = test_extraction(access_token, tenant_id="test", limit=5)
-        print(f"✅ Extracted {len(deals)} deals")
+        first = next(deals, None)
+        count = 0 if first is None else 1 + sum(1 for _ in deals)
+        print(f"✅ Extracted {count} deals")
         
-        if deals:
+        if first is not None:
             print("\nFirst deal (transformed):")
-            first = deals[0]
             print(f"  - Deal ID: {first['deal_id']}")
             print(f"  - Name: {first['deal_name']}")
             print(f"  - Amount: ${first['amount']}")
@@ -49,7 +51,7 @@ def main():
     
     # Test 2: DLT Source initialization
     print("\n🔧 Test 2: DLT Source Initialization")
-    print("-" * 60)
+    print(SECTION_LINE)
     try:
         source = hubspot_deals_source(
             access_token=access_token,
@@ -63,9 +65,9 @@ def main():
         print(f"❌ DLT source initialization failed: {e}")
         return
     
-    print("\n" + "=" * 60)
+    print("\n" + BANNER_LINE)
     print("✅ ALL TESTS COMPLETED")
-    print("=" * 60)
+    print(BANNER_LINE)
 
 if __name__ == "__main__":
     main()